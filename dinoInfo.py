@@ -1,14 +1,48 @@
+import asyncio
+import hashlib
+import multiprocessing
 import discord
 import os
 import dotenv
-from discord import Embed
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from discord import Embed, File
 from typing import List, Dict, Optional
-from graphviz import Digraph
+from graphviz import Digraph, Source
+from rich import print as print
 
 dotenv.load_dotenv()
 
+# `or` rather than a getenv default, since a blank entry in .env comes through as ""
+CLADOGRAM_CACHE_DIR = os.getenv("CLADOGRAM_CACHE_DIR") or "cladogram_cache"
+CLADOGRAM_FILENAME = "cladogram.png"
+# Taxoboxes run 12-18 ranks deep, and Discord scales embed images down, so only the narrowest ones are drawn
+CLADOGRAM_MAX_RANKS = 8
 
-def get_dino_fact_embeds(dino: dict) -> List[Embed]:
+# graphviz already lays the graph out in its own `dot` subprocess. The pool only keeps the blocking wait on it (and the
+# file write) off the event loop
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_dino_fact_message(dino: dict) -> Dict:
+    """
+    Builds the embeds and attachments for a dino post, as keyword arguments for send(). A discord File can only
+    be sent once, so this has to be called per message, but it only opens the already rendered image.
+    :param dino:
+    :return:
+    """
+    files = []
+    if dino.get('cladogram'):
+        try:
+            files.append(File(dino['cladogram'], filename=CLADOGRAM_FILENAME))
+        except OSError as e:
+            # The cache can be cleared out during the day, in which case the post just goes out without the image
+            print(f"[red]Couldn't open the cladogram for {dino.get('name')}: {e}[/red]")
+
+    return {'embeds': get_dino_fact_embeds(dino, with_cladogram=bool(files)), 'files': files}
+
+
+def get_dino_fact_embeds(dino: dict, with_cladogram: bool = False) -> List[Embed]:
     embeds = [Embed(
         title=dino.get('name'),
         description=dino.get('summary'),
@@ -25,4 +59,110 @@ def get_dino_fact_embeds(dino: dict) -> List[Embed]:
     #     embed = Embed(title=dino['sections'][section]['title'], description=dino['sections'][section]['text'], color=discord.Colour.green())
     #     embeds.append(embed)
 
+    if with_cladogram:
+        cladogram_embed = Embed(
+            title="Classification",
+            color=discord.Colour.green()
+        )
+        cladogram_embed.set_image(url=f"attachment://{CLADOGRAM_FILENAME}")
+        embeds.insert(1, cladogram_embed)
+
     return embeds
+
+
+def build_cladogram(dino: dict) -> Optional[Digraph]:
+    """
+    Builds a top to bottom ladder cladogram from the infobox's scientific classification, keeping the
+    CLADOGRAM_MAX_RANKS narrowest taxa.
+    :param dino:
+    :return: None if the infobox doesn't give at least two ranks, since that isn't a lineage
+    """
+    classification = dino.get('classification') or []
+    if len(classification) < 2:
+        return None
+
+    graph = Digraph(name=dino.get('name'), node_attr={'shape': 'plaintext'})
+
+    trimmed = len(classification) > CLADOGRAM_MAX_RANKS
+    classification = classification[-CLADOGRAM_MAX_RANKS:]
+    if trimmed:
+        # Shows the lineage carries on above the first drawn taxon
+        graph.node('more', label="⋮")
+        graph.edge('more', '0', arrowhead='none')
+
+    for i, (rank, name) in enumerate(classification):
+        graph.node(str(i), label=f"{name}\n({rank.lower()})")
+        if i:
+            graph.edge(str(i - 1), str(i))
+
+    graph.node(str(len(classification) - 1), shape='box')
+
+    return graph
+
+
+def _render_png(source: str, path: str) -> str:
+    """
+    Runs in a worker process. Writes to a temp file first so a half written image is never picked up from the cache.
+    """
+    png = Source(source).pipe(format='png')
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(png)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return path
+
+
+async def render_cladogram(dino: dict) -> Optional[str]:
+    """
+    Renders the dino's cladogram to a PNG, reusing the cached one if this exact graph has been rendered before.
+    :param dino:
+    :return: the path to the PNG, or None if there is nothing to render or rendering failed
+    """
+    graph = build_cladogram(dino)
+    if graph is None:
+        return None
+
+    content_hash = hashlib.sha256(graph.source.encode()).hexdigest()
+    path = os.path.join(CLADOGRAM_CACHE_DIR, f"{content_hash}.png")
+
+    if os.path.exists(path):
+        return path
+
+    return await _render_to_cache(graph.source, path, dino.get('name'))
+
+
+async def _render_to_cache(source: str, path: str, name: str) -> Optional[str]:
+    try:
+        os.makedirs(CLADOGRAM_CACHE_DIR, exist_ok=True)
+        try:
+            return await _run_render(source, path)
+        except BrokenProcessPool:
+            # _run_render dropped the broken pool, so the retry runs on a fresh one
+            return await _run_render(source, path)
+    except Exception as e:
+        print(f"[red]Failed to render cladogram for {name}: {e}[/red]")
+        return None
+
+
+async def _run_render(source: str, path: str) -> str:
+    global _render_pool
+
+    if _render_pool is None:
+        # The pool is made from inside the running client, which already has the gateway heartbeat thread and open
+        # sockets. Forking that risks deadlocks, so the worker starts fresh (spawn where forkserver doesn't exist)
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        _render_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(start_method))
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_render_pool, _render_png, source, path)
+    except BrokenProcessPool:
+        # A worker that dies (OOM killer...) breaks the whole pool, so drop it and let the next render start a new one
+        _render_pool.shutdown(wait=False)
+        _render_pool = None
+        raise
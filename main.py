@@ -11,8 +11,9 @@ We need the following commands:
 
 import os
 import random
+import re
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from zoneinfo import ZoneInfo, available_timezones
 import asyncio
 
@@ -239,7 +240,7 @@ async def send_daily(interaction: discord.Interaction):
     await interaction.response.defer(thinking=True, ephemeral=True)
     for server in servers:
         if server.get("guild_id") == interaction.guild.id:
-            await client.get_channel(server.get("channel_id")).send(embeds=dinoInfo.get_dino_fact_embeds(daily_dino))
+            await client.get_channel(server.get("channel_id")).send(**dinoInfo.get_dino_fact_message(daily_dino))
             await interaction.edit_original_response(embed=Embed(title="Successfully Sent Dino Message!",
                                                                  description="Check the channel to see the new message"))
             return
@@ -288,7 +289,7 @@ async def attempt_daily_send(server):
         if current_tuple == scheduled_tuple:
             try:
                 channel = client.get_channel(server.get("channel_id"))
-                message = await channel.send(embeds=dinoInfo.get_dino_fact_embeds(daily_dino), view=mv.DinoPostView())
+                message = await channel.send(**dinoInfo.get_dino_fact_message(daily_dino), view=mv.DinoPostView())
                 await message.create_thread(name=f"Discuss {daily_dino.get('name')}")
             except discord.errors.Forbidden as e:
                 print(
@@ -304,7 +305,11 @@ async def attempt_daily_send(server):
 async def get_daily_dino_task():
     global daily_dino
     while True:
-        daily_dino = parse_daily_dino(db.get_random_dino())
+        dino = parse_daily_dino(db.get_random_dino())
+        if dino:
+            # Rendered once here so every guild just attaches the cached image
+            dino['cladogram'] = await dinoInfo.render_cladogram(dino)
+        daily_dino = dino
 
         # 1 minute -> 1 hour -> 24 hours
         await asyncio.sleep(60 * 60 * 24)
@@ -337,7 +342,8 @@ def parse_daily_dino(dino: dict) -> Optional[Dict]:
         'url': dino.get('href'),
         'summary': page.summary,
         'thumbnail': thumbnail_url,
-        'sections': extract_sections(page.sections)
+        'sections': extract_sections(page.sections),
+        'classification': extract_classification(info_box)
     }
 
     print(dino_data)
@@ -374,6 +380,59 @@ def extract_sections(sections, level: int = 0) -> Dict[str, str]:
     return extracted
 
 
+def extract_classification(info_box) -> List[Tuple[str, str]]:
+    """
+    Reads the "Scientific classification" rows of the infobox. Wikipedia lists them from the broadest
+    taxon down, each one containing the next, so the row order is the lineage.
+    :param info_box:
+    :return: (rank, name) pairs, empty if the infobox has no classification
+    """
+    classification = []
+
+    # split/join folds the non-breaking spaces Wikipedia sometimes puts in the header
+    header = info_box.find(
+        lambda tag: tag.name == 'th' and 'Scientific classification' in ' '.join(tag.get_text().split())
+    )
+    if not header:
+        return classification
+
+    for row in header.find_parent('tr').find_next_siblings('tr'):
+        cells = row.find_all('td', recursive=False)
+        # The next header ("Type species", "Synonyms"...) ends the classification
+        if len(cells) != 2:
+            break
+
+        rank = cells[0].get_text(strip=True).rstrip(':')
+        name = extract_taxon_name(cells[1])
+        if rank and name:
+            classification.append((rank, name))
+
+    return classification
+
+
+def extract_taxon_name(cell) -> str:
+    """
+    Pulls the taxon name out of a classification cell, leaving out the authority ("Osborn, 1905")
+    the taxobox puts under it on the genus row.
+    :param cell:
+    :return:
+    """
+    # The name is the first link or bold/italic text, skipping citation links
+    element = cell.find(lambda tag: tag.name in ('a', 'b', 'i') and not tag.find_parent('sup'))
+    if element:
+        text = element.get_text(" ", strip=True)
+    else:
+        # Plain text name, so cut it off at the line break before the authority
+        text = ""
+        for child in cell.children:
+            if child.name == 'br':
+                break
+            text += child.get_text() if child.name else child
+
+    # Drop citation markers and the extinct dagger
+    return re.sub(r"\[.*?]", "", text).replace("†", "").strip()
+
+
 # --- Cache Thread Stuff ---
 async def refresh_cache_thread():
     print("Starting cache refresh thread...")